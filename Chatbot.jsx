@@ -5,7 +5,11 @@ import './App.css';
 
 function Chatbot() {
   const [messages, setMessages] = useState([]);
-  const [context, setContext] = useState({});
+  // Reuse the server-side session across reloads so the persisted cart is restored
+  const [context, setContext] = useState(() => {
+    const sessionId = localStorage.getItem("session_id");
+    return sessionId ? { session_id: sessionId } : {};
+  });
   const messagesEndRef = useRef(null);
   const hasSentStartMessage = useRef(false);
 
@@ -40,6 +44,9 @@ function Chatbot() {
       const data = response.data;
       setMessages((prev) => [...prev, { sender: "bot", text: data.response }]);
       setContext(data.context);
+      if (data.context.session_id) {
+        localStorage.setItem("session_id", data.context.session_id);
+      }
     } catch (error) {
       console.error("Error sending message:", error);
       setMessages((prev) => [...prev, { sender: "bot", text: "Sorry, there was an error communicating with the server." }]);
@@ -0,0 +1,256 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# Default location of the local cart/order database
+CART_DB_PATH = "carts.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cart_items (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    gadget_id INTEGER NOT NULL,
+    PRIMARY KEY (session_id, position)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id TEXT NOT NULL,
+    gadget_id INTEGER NOT NULL,
+    price INTEGER NOT NULL
+);
+"""
+
+
+class CartStore:
+    """Durable carts and orders keyed by session, persisted with a write-behind buffer.
+
+    Reads and writes from the request path only touch the in-memory view. Mutations are
+    queued and committed by a background thread in batches that span many sessions.
+
+    Locking: `_cond` guards the in-memory state, `_db_lock` guards the writer connection and
+    `_read_lock` a separate read connection. None of them is held together with another, and WAL
+    lets cart loads read while a flush is committing, so requests never wait behind a flush.
+    """
+
+    def __init__(self, db_path=CART_DB_PATH, flush_interval=0.5, max_batch=256, max_sessions=10000, max_attempts=5):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_sessions = max_sessions
+        self.max_attempts = max_attempts
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._read_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._read_lock = threading.Lock()
+
+        # Session carts already loaded from disk (authoritative once present), least recently used first
+        self._carts = OrderedDict()
+        # Number of queued-but-uncommitted writes per session; only clean sessions may be evicted
+        self._dirty = {}
+        # Pending write units: (session_id, [(sql, params), ...], attempts); each unit commits atomically
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._run_writer, name="cart-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _cached_cart(self, session_id):
+        # Caller holds _cond
+        cart = self._carts.get(session_id)
+        if cart is not None:
+            self._carts.move_to_end(session_id)
+        return cart
+
+    def _load_cart(self, session_id):
+        """Returns the cached cart list, reading it from disk first if needed. Call without `_cond` held."""
+        with self._cond:
+            cart = self._cached_cart(session_id)
+        if cart is not None:
+            return cart
+
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT gadget_id FROM cart_items WHERE session_id = ? ORDER BY position",
+                (session_id,),
+            ).fetchall()
+        with self._cond:
+            # Another request may have loaded (and changed) the cart in the meantime; keep theirs
+            cart = self._carts.setdefault(session_id, [row[0] for row in rows])
+            self._carts.move_to_end(session_id)
+            return cart
+
+    def new_session(self, session_id):
+        """Registers a freshly created session as having an empty cart, so it is never read from disk."""
+        with self._cond:
+            self._carts.setdefault(session_id, [])
+            self._carts.move_to_end(session_id)
+            self._evict()
+
+    def _enqueue(self, session_id, ops):
+        # Caller holds _cond
+        self._pending.append((session_id, ops, 0))
+        self._dirty[session_id] = self._dirty.get(session_id, 0) + 1
+        if len(self._pending) >= self.max_batch:
+            self._cond.notify()
+
+    def get_cart(self, session_id):
+        """Returns the gadget IDs in a session's cart."""
+        cart = self._load_cart(session_id)
+        with self._cond:
+            return list(cart)
+
+    def add_item(self, session_id, gadget_id):
+        """Appends a gadget to a session's cart and returns the updated list of IDs."""
+        cart = self._load_cart(session_id)
+        with self._cond:
+            position = len(cart)
+            cart.append(gadget_id)
+            self._enqueue(session_id, [(
+                "INSERT OR REPLACE INTO cart_items (session_id, position, gadget_id) VALUES (?, ?, ?)",
+                (session_id, position, gadget_id),
+            )])
+            return list(cart)
+
+    def finalize_order(self, session_id, items):
+        """Records an order and empties the session's cart. Returns the order ID.
+
+        `items` is the resolved cart as (gadget ID, price) pairs; cart entries that could not be
+        resolved (e.g. gadgets no longer in the catalog) are simply cleared with the cart.
+        """
+        self._load_cart(session_id)
+        with self._cond:
+            order_id = uuid4().hex
+            total = sum(price for _, price in items)
+            ops = [(
+                "INSERT INTO orders (order_id, session_id, total, created_at) VALUES (?, ?, ?, ?)",
+                (order_id, session_id, total, time.time()),
+            )]
+            ops.extend(
+                ("INSERT INTO order_items (order_id, gadget_id, price) VALUES (?, ?, ?)", (order_id, gadget_id, price))
+                for gadget_id, price in items
+            )
+            ops.append(("DELETE FROM cart_items WHERE session_id = ?", (session_id,)))
+            self._carts[session_id] = []
+            self._enqueue(session_id, ops)
+            return order_id
+
+    def _commit(self, units):
+        # Caller holds _db_lock
+        with self._conn:
+            for _, ops, _ in units:
+                for sql, params in ops:
+                    self._conn.execute(sql, params)
+
+    def flush(self):
+        """Commits every queued write, in one transaction when possible."""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        # held: uncommitted units in batch order, with their error (None if held behind a failed unit)
+        committed, held = [], []
+        with self._db_lock:
+            try:
+                self._commit(batch)
+                committed = batch
+            except Exception as e:
+                logger.error(f"Failed to flush {len(batch)} cart writes, retrying them one by one: {e}")
+                # Isolate the failing units so one bad write cannot hold back other sessions; once a
+                # session's unit fails, its later units wait too so they never commit out of order
+                blocked = set()
+                for unit in batch:
+                    if unit[0] in blocked:
+                        held.append((unit, None))
+                        continue
+                    try:
+                        self._commit([unit])
+                        committed.append(unit)
+                    except Exception as unit_error:
+                        held.append((unit, unit_error))
+                        blocked.add(unit[0])
+
+        with self._cond:
+            retry = []
+            for unit, error in held:
+                session_id, ops, attempts = unit
+                if error is None:
+                    retry.append(unit)
+                elif attempts + 1 >= self.max_attempts:
+                    logger.error(f"Dropping cart write for session {session_id} after {attempts + 1} attempts: {error}")
+                    committed.append(unit)
+                else:
+                    retry.append((session_id, ops, attempts + 1))
+            # Held units go back in front, in batch order, so per-session order is preserved
+            self._pending = retry + self._pending
+            for session_id, _, _ in committed:
+                self._dirty[session_id] -= 1
+                if not self._dirty[session_id]:
+                    del self._dirty[session_id]
+            self._evict()
+        if held and not committed:
+            raise RuntimeError(f"{len(held)} cart writes failed")
+
+    def _evict(self):
+        # Caller holds _cond. Drop least recently used carts that have nothing left to write.
+        if len(self._carts) <= self.max_sessions:
+            return
+        for session_id in list(self._carts):
+            if len(self._carts) <= self.max_sessions:
+                break
+            if session_id not in self._dirty:
+                del self._carts[session_id]
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Already logged; back off before retrying
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        """Stops the writer thread and flushes outstanding writes to disk."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        # Retried units need further passes; bounded by max_attempts
+        for _ in range(self.max_attempts):
+            with self._cond:
+                if not self._pending:
+                    break
+            try:
+                self.flush()
+            except Exception:
+                pass
+        with self._db_lock:
+            self._conn.close()
+        with self._read_lock:
+            self._read_conn.close()
+        logger.info("Cart store flushed and closed.")
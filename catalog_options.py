@@ -0,0 +1,40 @@
+# Define brands for each category
+category_brands = {
+    "smartphone": ["apple", "samsung", "xiaomi", "oneplus"],
+    "laptop": ["dell", "hp", "asus", "lenovo", "microsoft", "apple"],
+    "tablet": ["apple", "samsung", "xiaomi", "lenovo"],
+    "smartwatch": ["apple", "samsung", "garmin", "oneplus"],
+    "headphones": ["sony", "sennheiser", "bose", "jbl"]
+}
+
+# Define budget ranges for each category
+category_budget_ranges = {
+    "smartphone": {
+        "300-800": (300, 800),
+        "801-1200": (801, 1200),
+        "1201-1800": (1201, 1800),
+        "1801-2500": (1801, 2500)
+    },
+    "laptop": {
+        "500-1000": (500, 1000),
+        "1001-1500": (1001, 1500),
+        "1501-2000": (1501, 2000),
+        "2001-3000": (2001, 3000)
+    },
+    "tablet": {
+        "200-500": (200, 500),
+        "501-800": (501, 800),
+        "801-1200": (801, 1200),
+        "1201-1500": (1201, 1500)
+    },
+    "smartwatch": {
+        "100-300": (100, 300),
+        "301-500": (301, 500),
+        "501-800": (501, 800)
+    },
+    "headphones": {
+        "50-150": (50, 150),
+        "151-300": (151, 300),
+        "301-600": (301, 600)
+    }
+}
@@ -1,5 +1,5 @@
 import chromadb
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from embedding_backend import load_embedding_model
 
 from langchain_community.llms import LlamaCpp
 
@@ -8,8 +8,8 @@ from langchain_community.llms import LlamaCpp
 client = chromadb.PersistentClient(path="E:/STEPPING EDGE/ELEC_AND_GADGETS_CHATBOT")
 collection = client.get_collection("electronics")
 
-# Load Embedding Model (Hugging Face)
-embedding_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# Load Embedding Model (same MiniLM backend as the API servers)
+embedding_model = load_embedding_model()
 
 # Load AI Model (Llama 3.1B)
 llm = LlamaCpp(model_path="E:/STEPPING EDGE/models/Meta-Llama-3.1-8B-Instruct-Q4_K_M.gguf")
@@ -19,7 +19,7 @@ def chatbot_query(user_query):
     """Processes user queries, retrieves relevant documents, and generates responses."""
     
     # Convert user query into embedding
-    query_embedding = embedding_model.get_text_embedding(user_query)
+    query_embedding = embedding_model.encode(user_query).tolist()
 
 
     # Retrieve relevant products
@@ -0,0 +1,142 @@
+import argparse
+import csv
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from embedding_backend import load_embedding_model
+
+DATASET_PATH = "gadgets_dataset.csv"
+
+# Parity thresholds for the int8 model against fp32; `parity` exits non-zero below these
+MIN_COSINE_MEAN = 0.99
+MIN_COSINE = 0.97
+MIN_TOP_K_OVERLAP_MEAN = 0.9
+
+
+# Same catalog text that main.py embeds into the FAISS index
+def load_descriptions(path=DATASET_PATH):
+    with open(path, mode="r", encoding="utf-8") as file:
+        return [
+            f"{row['Product Name']} {row['Category']} {row['Brand']} {row['Specifications']} {row['Features']}"
+            for row in csv.DictReader(file)
+        ]
+
+
+def top_k_neighbours(embeddings, k):
+    similarities = embeddings @ embeddings.T
+    np.fill_diagonal(similarities, -np.inf)
+    return np.argsort(-similarities, axis=1)[:, :k]
+
+
+# Compare int8 ONNX vectors against the fp32 SentenceTransformer vectors
+def parity_check(k=10, min_cosine_mean=MIN_COSINE_MEAN, min_cosine=MIN_COSINE, min_overlap_mean=MIN_TOP_K_OVERLAP_MEAN):
+    descriptions = load_descriptions()
+    reference = np.asarray(load_embedding_model("torch").encode(descriptions, convert_to_numpy=True))
+    candidate = np.asarray(load_embedding_model("onnx").encode(descriptions, convert_to_numpy=True))
+
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = (reference * candidate).sum(axis=1)
+
+    reference_top = top_k_neighbours(reference, k)
+    candidate_top = top_k_neighbours(candidate, k)
+    overlap = np.array([
+        len(set(ref_row) & set(cand_row)) / k
+        for ref_row, cand_row in zip(reference_top, candidate_top)
+    ])
+
+    failures = []
+    if cosine.mean() < min_cosine_mean:
+        failures.append(f"cosine_mean {cosine.mean():.4f} < {min_cosine_mean}")
+    if cosine.min() < min_cosine:
+        failures.append(f"cosine_min {cosine.min():.4f} < {min_cosine}")
+    if overlap.mean() < min_overlap_mean:
+        failures.append(f"top{k}_overlap_mean {overlap.mean():.4f} < {min_overlap_mean}")
+
+    return {
+        "items": len(descriptions),
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"top{k}_overlap_mean": float(overlap.mean()),
+        f"top{k}_overlap_min": float(overlap.min()),
+        "passed": not failures,
+        "failures": failures,
+    }
+
+
+# Peak resident memory of this process in MB, or None if the platform gives no way to read it
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and KiB on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    # peak_wset is the Windows peak working set; other platforms only report current RSS
+    return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+# Time model load and catalog encoding for one backend (run in its own process for clean RSS numbers)
+def benchmark_backend(backend, repeats=3):
+    descriptions = load_descriptions()
+    start = time.perf_counter()
+    model = load_embedding_model(backend)
+    load_seconds = time.perf_counter() - start
+
+    model.encode(descriptions[:32], convert_to_numpy=True)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(descriptions, convert_to_numpy=True)
+        timings.append(time.perf_counter() - start)
+
+    peak_rss = peak_rss_mb()
+    best = min(timings)
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "encode_seconds": round(best, 3),
+        "texts_per_second": round(len(descriptions) / best, 1),
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check and benchmark for the MiniLM embedding backends")
+    parser.add_argument("command", choices=["parity", "benchmark", "benchmark-one"])
+    parser.add_argument("--backend", default="onnx")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine-mean", type=float, default=MIN_COSINE_MEAN)
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    parser.add_argument("--min-overlap-mean", type=float, default=MIN_TOP_K_OVERLAP_MEAN)
+    args = parser.parse_args()
+
+    if args.command == "parity":
+        report = parity_check(args.k, args.min_cosine_mean, args.min_cosine, args.min_overlap_mean)
+        print(json.dumps(report, indent=2))
+        if not report["passed"]:
+            sys.exit(1)
+    elif args.command == "benchmark-one":
+        print(json.dumps(benchmark_backend(args.backend)))
+    else:
+        for backend in ["torch", "onnx"]:
+            output = subprocess.run(
+                [sys.executable, __file__, "benchmark-one", "--backend", backend],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 import csv
+import os
 import numpy as np
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from pydantic import BaseModel
 from llama_cpp import Llama
 import faiss
-from sentence_transformers import SentenceTransformer
+from embedding_backend import EMBEDDING_BACKEND, load_embedding_model
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
+from uuid import uuid4
+from cart_store import CartStore
+from result_pages import SORT_ORDERS, ResultSets, make_cursor
+from catalog_options import category_brands, category_budget_ranges
+from preference_extractor import PreferenceExtractor
+from speculation import Speculator
+from sharded_retrieval import ShardedIndex, shard_specs
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -38,12 +46,16 @@ except Exception as e:
     logger.error(f"Failed to load LLaMA model: {e}")
     raise
 
-# Load the sentence transformer model for embeddings
+# Opt-in background precomputation of likely recommendations (SPECULATIVE_RECOMMENDATIONS=1).
+# Every LLM call goes through the speculator so foreground requests pre-empt speculative ones.
+speculator = Speculator(llm, enabled=os.environ.get("SPECULATIVE_RECOMMENDATIONS") == "1")
+
+# Load the sentence embedding model (EMBEDDING_BACKEND=onnx selects the int8 ONNX runtime)
 try:
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    logger.info("SentenceTransformer model loaded successfully.")
+    model = load_embedding_model()
+    logger.info(f"Embedding model loaded successfully ({EMBEDDING_BACKEND} backend).")
 except Exception as e:
-    logger.error(f"Failed to load SentenceTransformer model: {e}")
+    logger.error(f"Failed to load embedding model: {e}")
     raise
 
 # Load the tech gadgets dataset from CSV
@@ -89,55 +101,39 @@ def create_faiss_index(embeddings):
         logger.error(f"Failed to create FAISS index: {e}")
         raise
 
+# Retrieval layout: "" for one in-process FAISS index, "category" for a worker process per
+# category, or "hash:N" for N hash-partitioned workers
+RETRIEVAL_SHARDS = os.environ.get("RETRIEVAL_SHARDS", "")
+
+# Largest k accepted by /search
+MAX_SEARCH_K = 50
+
 # Global variables
 try:
     TECH_GADGETS_DATA = load_tech_gadgets_data()
-    embeddings = embed_tech_gadgets_data(TECH_GADGETS_DATA)
-    faiss_index = create_faiss_index(embeddings)
+    if RETRIEVAL_SHARDS:
+        # Each shard process embeds and indexes its own slice of the catalog
+        faiss_index = None
+        sharded_index = ShardedIndex(shard_specs(RETRIEVAL_SHARDS, list(category_brands)), "gadgets_dataset.csv")
+        sharded_index.start()
+    else:
+        sharded_index = None
+        embeddings = embed_tech_gadgets_data(TECH_GADGETS_DATA)
+        faiss_index = create_faiss_index(embeddings)
+    GADGETS_BY_ID = {gadget["ID"]: gadget for gadget in TECH_GADGETS_DATA}
+    result_sets = ResultSets(TECH_GADGETS_DATA)
+    preference_extractor = PreferenceExtractor(category_brands, category_budget_ranges)
 except Exception as e:
     logger.error(f"Failed to initialize global variables: {e}")
     raise
 
-# Define brands for each category
-category_brands = {
-    "smartphone": ["apple", "samsung", "xiaomi", "oneplus"],
-    "laptop": ["dell", "hp", "asus", "lenovo", "microsoft", "apple"],
-    "tablet": ["apple", "samsung", "xiaomi", "lenovo"],
-    "smartwatch": ["apple", "samsung", "garmin", "oneplus"],
-    "headphones": ["sony", "sennheiser", "bose", "jbl"]
-}
-
-# Define budget ranges for each category
-category_budget_ranges = {
-    "smartphone": {
-        "300-800": (300, 800),
-        "801-1200": (801, 1200),
-        "1201-1800": (1201, 1800),
-        "1801-2500": (1801, 2500)
-    },
-    "laptop": {
-        "500-1000": (500, 1000),
-        "1001-1500": (1001, 1500),
-        "1501-2000": (1501, 2000),
-        "2001-3000": (2001, 3000)
-    },
-    "tablet": {
-        "200-500": (200, 500),
-        "501-800": (501, 800),
-        "801-1200": (801, 1200),
-        "1201-1500": (1201, 1500)
-    },
-    "smartwatch": {
-        "100-300": (100, 300),
-        "301-500": (301, 500),
-        "501-800": (501, 800)
-    },
-    "headphones": {
-        "50-150": (50, 150),
-        "151-300": (151, 300),
-        "301-600": (301, 600)
-    }
-}
+# Persistent carts and orders (SQLite, flushed in the background)
+try:
+    cart_store = CartStore()
+    logger.info("Cart store opened successfully.")
+except Exception as e:
+    logger.error(f"Failed to open cart store: {e}")
+    raise
 
 # Pydantic model for chat requests
 class ChatRequest(BaseModel):
@@ -174,28 +170,155 @@ def compare_products(retrieved_items):
 
     return comparison_summary
 
+# Semantic search over the catalog; sharded mode routes by category or scatter-gathers across shards
+def search_gadgets(query, category=None, k=3):
+    query_embedding = np.asarray(model.encode([query], convert_to_numpy=True), dtype=np.float32)
+    if sharded_index is not None:
+        hits = sharded_index.search(query_embedding[0], k=k, category=category)
+        return [GADGETS_BY_ID[gadget_id] for _, gadget_id in hits]
+
+    # Single in-process index: rank the whole catalog when a category filter has to be applied
+    _, positions = faiss_index.search(query_embedding, faiss_index.ntotal if category else k)
+    gadgets = [TECH_GADGETS_DATA[position] for position in positions[0] if position >= 0]
+    if category:
+        gadgets = [gadget for gadget in gadgets if gadget["Category"].lower() == category]
+    return gadgets[:k]
+
+# Show the next page of the current recommendations by advancing the stored cursor
+def show_next_results(context):
+    next_cursor = context.get("next_cursor")
+    if not next_cursor:
+        return "There are no more results for your preferences. Would you like to explore more options? (options: explore more, stop)"
+
+    try:
+        gadgets, context["next_cursor"] = result_sets.page(next_cursor)
+    except ValueError as e:
+        logger.warning(f"Ignoring invalid next_cursor: {e}")
+        context["next_cursor"] = None
+        return "There are no more results for your preferences. Would you like to explore more options? (options: explore more, stop)"
+    if not gadgets:
+        return "There are no more results for your preferences. Would you like to explore more options? (options: explore more, stop)"
+    context["last_retrieved_items"] = gadgets
+    context["recommendation_history"].append(next_cursor)
+    context["current_step"] = "recommend"
+
+    response = "Here are more options that match your preferences!\n"
+    for gadget in gadgets:
+        response += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
+    response += "Which one of these devices catches your eye? Let me know and I can provide more information!"
+    return f"{response}\nWould you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, show next results, explore more, go back to the previous recommendations)"
+
+# Prompt asking LLaMA to introduce a page of recommendations
+def build_recommendation_prompt(preferences, gadgets):
+    prompt = f"Based on the user's preferences (category: {preferences['category']}, brand: {preferences['brand']}, budget: {preferences['budget'][0]}-{preferences['budget'][1]}), I found the following gadgets:\n"
+    for gadget in gadgets:
+        prompt += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
+    prompt += "Generate a friendly and inviting response introducing these gadgets to the user in a conversational tone. Start with a warm greeting like 'Let me show you some awesome options that fit your budget and preferences!' Mention each gadget's name, price (with a dollar symbol), features, user reviews, and popularity score. Encourage the user to engage further by asking 'Which one of these devices catches your eye? Let me know and I can provide more information!' Also, mention that these options fit within the user's budget."
+    return prompt
+
+# Runs in the background while the user picks a sort order: warm every candidate result set and
+# pre-generate the introduction for the most likely choice
+def speculate_sort_step(preferences):
+    for sort in SORT_ORDERS:
+        result_sets.page(make_cursor({**preferences, "sort": sort}))
+    likely_sort = speculator.likely_choice("sort", default="best seller")
+    gadgets, _ = result_sets.page(make_cursor({**preferences, "sort": likely_sort}))
+    if gadgets:
+        speculator.speculate_llm(build_recommendation_prompt(preferences, gadgets), max_tokens=500, stop=["\n\n"], temperature=0.7)
+
+# Look up the user's recommendations and introduce them (requires category, brand, budget and sort)
+def recommend_gadgets(context):
+    preferences = context["preferences"]
+    context["current_step"] = "recommend"
+
+    logger.info(f"Preferences: {preferences}")
+
+    # Filtering and sorting happen once per (filter key, sort); pages are slices of the cached result set
+    cursor = make_cursor(preferences)
+    filtered_gadgets, context["next_cursor"] = result_sets.page(cursor)
+
+    if not filtered_gadgets:
+        return f"Sorry, I couldn't find any {preferences['category']}s from {preferences['brand'].capitalize()} in the price range ${preferences['budget'][0]}-${preferences['budget'][1]}. Would you like to explore more options? (options: explore more, stop)"
+
+    context["last_retrieved_items"] = filtered_gadgets
+    context["recommendation_history"].append(cursor)
+
+    # Prepare the product list to ensure it's always displayed
+    product_list = "Let me show you some awesome options that fit your budget and preferences!\n"
+    for gadget in filtered_gadgets:
+        product_list += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
+
+    # Try to generate a response with LLaMA, reusing a speculative one if the user picked the option we guessed
+    prompt = build_recommendation_prompt(preferences, filtered_gadgets)
+
+    try:
+        response = speculator.take(prompt)
+        if response is None:
+            llm_response = speculator.generate(prompt, max_tokens=500, stop=["\n\n"], temperature=0.7)
+            response = llm_response["choices"][0]["text"].strip()
+        # Ensure the response contains the product list
+        if not any(gadget["Product Name"] in response for gadget in filtered_gadgets):
+            response = product_list + "\nWhich one of these devices catches your eye? Let me know and I can provide more information!"
+    except Exception as e:
+        logger.error(f"Failed to generate LLM response: {e}")
+        response = product_list + "\nWhich one of these devices catches your eye? Let me know and I can provide more information!"
+
+    return f"{response}\nThese options all fit within your budget of ${preferences['budget'][0]}-${preferences['budget'][1]}. Would you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, show next results, explore more, go back to the previous recommendations)"
+
+# Ask for the next missing preference, or go straight to recommendations once everything is known
+def advance_funnel(context):
+    preferences = context["preferences"]
+    if "category" not in preferences:
+        context["current_step"] = "category"
+        return "What type of gadget are you looking for? (options: Smartphone, Laptop, Tablet, Smartwatch, Headphones)"
+    if "brand" not in preferences:
+        context["current_step"] = "brand"
+        brands_str = ", ".join([brand.capitalize() for brand in category_brands[preferences["category"]]])
+        return f"Which brand do you prefer for your {preferences['category']}? (options: {brands_str})"
+    if "budget" not in preferences:
+        context["current_step"] = "budget"
+        budget_options = ", ".join([f"${key.replace('-', '-$')}" for key in category_budget_ranges[preferences["category"]].keys()])
+        return f"What’s your budget range for your gadget? (options: {budget_options})"
+    if "sort" not in preferences:
+        context["current_step"] = "sort"
+        speculator.submit(lambda snapshot=dict(preferences): speculate_sort_step(snapshot))
+        return "How would you like to sort the recommendations? (options: best seller, new arrival, price low to high, price high to low)"
+    return recommend_gadgets(context)
+
 # Process user messages and manage conversation state
 def process_message(message, context):
     if "current_step" not in context:
         context["current_step"] = "category"
         context["preferences"] = {}
         context["recommendation_history"] = []
+    if "session_id" not in context:
+        context["session_id"] = uuid4().hex
+        cart_store.new_session(context["session_id"])
+    session_id = context["session_id"]
 
     current_step = context["current_step"]
     preferences = context["preferences"]
 
     if message == "start":
         context["current_step"] = "category"
+        context["preferences"] = {}
         return "What type of gadget are you looking for? (options: Smartphone, Laptop, Tablet, Smartwatch, Headphones)", context
 
     if current_step == "category":
         categories = ["smartphone", "laptop", "tablet", "smartwatch", "headphones"]
         if message in categories:
+            preferences.clear()
             preferences["category"] = message
             context["current_step"] = "brand"
             relevant_brands = category_brands[message]
             brands_str = ", ".join([brand.capitalize() for brand in relevant_brands])
             return f"Which brand do you prefer for your {message}? (options: {brands_str})", context
+        # Free text such as "samsung phone under 1000, cheapest first"
+        extracted = preference_extractor.extract(message)
+        if "category" in extracted:
+            # Only what this message says; nothing carries over from an earlier search
+            context["preferences"] = extracted
+            return advance_funnel(context), context
         return "Please select a valid category: Smartphone, Laptop, Tablet, Smartwatch, Headphones", context
 
     if current_step == "brand":
@@ -207,6 +330,12 @@ def process_message(message, context):
             # Add dollar symbol to budget options
             budget_options = ", ".join([f"${key.replace('-', '-$')}" for key in budget_ranges.keys()])
             return f"What’s your budget range for your gadget? (options: {budget_options})", context
+        extracted = preference_extractor.extract(message)
+        extracted.pop("category", None)
+        if extracted.get("brand") in relevant_brands:
+            # Keep the chosen category; budget and sort only if this message gives them
+            context["preferences"] = {"category": preferences["category"], **extracted}
+            return advance_funnel(context), context
         brands_str = ", ".join([brand.capitalize() for brand in relevant_brands])
         return f"Please select a valid brand: {brands_str}", context
 
@@ -216,76 +345,24 @@ def process_message(message, context):
         cleaned_message = message.replace("$", "")
         if cleaned_message in budget_ranges:
             preferences["budget"] = budget_ranges[cleaned_message]
-            context["current_step"] = "sort"
-            return "How would you like to sort the recommendations? (options: best seller, new arrival, price low to high, price high to low)", context
+            return advance_funnel(context), context
+        extracted = preference_extractor.extract(message)
+        if "budget" in extracted:
+            context["preferences"] = {"category": preferences["category"], "brand": preferences["brand"], "budget": extracted["budget"]}
+            if "sort" in extracted:
+                context["preferences"]["sort"] = extracted["sort"]
+            return advance_funnel(context), context
         budget_options = ", ".join([f"${key.replace('-', '-$')}" for key in budget_ranges.keys()])
         return f"Please select a valid budget range: {budget_options}", context
 
     if current_step == "sort":
         sort_options = ["best seller", "new arrival", "price low to high", "price high to low"]
-        if message in sort_options:
-            preferences["sort"] = message
-            context["current_step"] = "recommend"
-
-            logger.info(f"Preferences: {preferences}")
-
-            filtered_gadgets = TECH_GADGETS_DATA
-            logger.info(f"Total gadgets before filtering: {len(filtered_gadgets)}")
-
-            if "category" in preferences:
-                filtered_gadgets = [gadget for gadget in filtered_gadgets if gadget["Category"].lower() == preferences["category"].lower()]
-                logger.info(f"Gadgets after category filter ({preferences['category']}): {len(filtered_gadgets)}")
-
-            if "brand" in preferences:
-                filtered_gadgets = [gadget for gadget in filtered_gadgets if gadget["Brand"].lower() == preferences["brand"].lower()]
-                logger.info(f"Gadgets after brand filter ({preferences['brand']}): {len(filtered_gadgets)}")
-
-            if "budget" in preferences:
-                min_price, max_price = preferences["budget"]
-                filtered_gadgets = [gadget for gadget in filtered_gadgets if min_price <= gadget["Price"] <= max_price]
-                logger.info(f"Gadgets after budget filter ({min_price}-{max_price}): {len(filtered_gadgets)}")
-
-            if preferences["sort"] == "best seller":
-                filtered_gadgets.sort(key=lambda x: x["Popularity Score"], reverse=True)
-            elif preferences["sort"] == "new arrival":
-                filtered_gadgets.sort(key=lambda x: x["ID"], reverse=True)
-            elif preferences["sort"] == "price low to high":
-                filtered_gadgets.sort(key=lambda x: x["Price"])
-            elif preferences["sort"] == "price high to low":
-                filtered_gadgets.sort(key=lambda x: x["Price"], reverse=True)
-
-            logger.info(f"Filtered gadgets: {filtered_gadgets}")
-
-            filtered_gadgets = filtered_gadgets[:3]
-
-            if not filtered_gadgets:
-                return f"Sorry, I couldn't find any {preferences['category']}s from {preferences['brand'].capitalize()} in the price range ${preferences['budget'][0]}-${preferences['budget'][1]}. Would you like to explore more options? (options: explore more, stop)", context
-
-            context["last_retrieved_items"] = filtered_gadgets
-            context["recommendation_history"].append(filtered_gadgets)
-
-            # Prepare the product list to ensure it's always displayed
-            product_list = "Let me show you some awesome options that fit your budget and preferences!\n"
-            for gadget in filtered_gadgets:
-                product_list += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
-
-            # Try to generate a response with LLaMA
-            prompt = f"Based on the user's preferences (category: {preferences['category']}, brand: {preferences['brand']}, budget: {preferences['budget'][0]}-{preferences['budget'][1]}), I found the following gadgets:\n"
-            for gadget in filtered_gadgets:
-                prompt += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
-            prompt += "Generate a friendly and inviting response introducing these gadgets to the user in a conversational tone. Start with a warm greeting like 'Let me show you some awesome options that fit your budget and preferences!' Mention each gadget's name, price (with a dollar symbol), features, user reviews, and popularity score. Encourage the user to engage further by asking 'Which one of these devices catches your eye? Let me know and I can provide more information!' Also, mention that these options fit within the user's budget."
-
-            try:
-                llm_response = llm(prompt, max_tokens=500, stop=["\n\n"], temperature=0.7)
-                response = llm_response["choices"][0]["text"].strip()
-                # Ensure the response contains the product list
-                if not any(gadget["Product Name"] in response for gadget in filtered_gadgets):
-                    response = product_list + "\nWhich one of these devices catches your eye? Let me know and I can provide more information!"
-            except Exception as e:
-                logger.error(f"Failed to generate LLM response: {e}")
-                response = product_list + "\nWhich one of these devices catches your eye? Let me know and I can provide more information!"
-
-            return f"{response}\nThese options all fit within your budget of ${preferences['budget'][0]}-${preferences['budget'][1]}. Would you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, explore more, go back to the previous recommendations)", context
+        # Also accept phrasings such as "cheapest first" or "newest"
+        sort = message if message in sort_options else preference_extractor.extract(message).get("sort")
+        if sort:
+            preferences["sort"] = sort
+            speculator.record_choice("sort", sort)
+            return recommend_gadgets(context), context
 
         return "Please select a valid sort option: best seller, new arrival, price low to high, price high to low", context
 
@@ -294,7 +371,7 @@ def process_message(message, context):
             context["current_step"] = "compare_products"
             retrieved_items = context.get("last_retrieved_items", [])
             comparison_summary = compare_products(retrieved_items)
-            response = f"Here’s a detailed comparison of the recommended products:\n\n{comparison_summary}\nWould you like to proceed with one of these options, stop the process, explore more options, or go back to the previous recommendations? (options: proceed, stop, explore more, go back to the previous recommendations)"
+            response = f"Here’s a detailed comparison of the recommended products:\n\n{comparison_summary}\nWould you like to proceed with one of these options, stop the process, explore more options, or go back to the previous recommendations? (options: proceed, stop, show next results, explore more, go back to the previous recommendations)"
             return response, context
         elif message == "proceed":
             context["current_step"] = "select_product"
@@ -313,6 +390,8 @@ def process_message(message, context):
             context["preferences"] = {}
             context["recommendation_history"] = []
             return "Thanks for chatting! If you'd like to start over, just say 'start'.", context
+        elif message == "show next results":
+            return show_next_results(context), context
         elif message == "explore more":
             context["current_step"] = "category"
             context["preferences"] = {}
@@ -320,14 +399,19 @@ def process_message(message, context):
         elif message == "go back to the previous recommendations":
             if len(context["recommendation_history"]) > 1:
                 context["recommendation_history"].pop()
-                context["last_retrieved_items"] = context["recommendation_history"][-1]
+                try:
+                    context["last_retrieved_items"], context["next_cursor"] = result_sets.page(context["recommendation_history"][-1])
+                except ValueError as e:
+                    logger.warning(f"Ignoring invalid recommendation history: {e}")
+                    context["recommendation_history"] = []
+                    return "There are no previous recommendations to go back to. Would you like to explore more options? (options: explore more, stop)", context
                 prompt = "Here are the previous recommendations:\n"
                 for gadget in context["last_retrieved_items"]:
                     prompt += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
                 prompt += "Generate a friendly and inviting response reintroducing these gadgets to the user in a conversational tone. Start with a warm greeting like 'Let’s take a look at the previous options I found for you!' Mention each gadget's name, price (with a dollar symbol), features, user reviews, and popularity score. Encourage the user to engage further by asking 'Which one of these devices catches your eye now? Let me know and I can provide more information!'"
 
                 try:
-                    llm_response = llm(prompt, max_tokens=500, stop=["\n\n"], temperature=0.7)
+                    llm_response = speculator.generate(prompt, max_tokens=500, stop=["\n\n"], temperature=0.7)
                     response = llm_response["choices"][0]["text"].strip()
                     # Ensure the response contains the product list
                     if not any(gadget["Product Name"] in response for gadget in context["last_retrieved_items"]):
@@ -342,10 +426,10 @@ def process_message(message, context):
                         response += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
                     response += "Which one of these devices catches your eye now? Let me know and I can provide more information!"
 
-                return f"{response}\nWould you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, explore more, go back to the previous recommendations)", context
+                return f"{response}\nWould you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, show next results, explore more, go back to the previous recommendations)", context
             return "There are no previous recommendations to go back to. Would you like to explore more options? (options: explore more, stop)", context
 
-        return "Please select an option: compare, proceed, stop, explore more, go back to the previous recommendations", context
+        return "Please select an option: compare, proceed, stop, show next results, explore more, go back to the previous recommendations", context
 
     if current_step == "compare_products":
         if message == "proceed":
@@ -365,6 +449,8 @@ def process_message(message, context):
             context["preferences"] = {}
             context["recommendation_history"] = []
             return "Thanks for chatting! If you'd like to start over, just say 'start'.", context
+        elif message == "show next results":
+            return show_next_results(context), context
         elif message == "explore more":
             context["current_step"] = "category"
             context["preferences"] = {}
@@ -372,7 +458,12 @@ def process_message(message, context):
         elif message == "go back to the previous recommendations":
             if len(context["recommendation_history"]) > 1:
                 context["recommendation_history"].pop()
-                context["last_retrieved_items"] = context["recommendation_history"][-1]
+                try:
+                    context["last_retrieved_items"], context["next_cursor"] = result_sets.page(context["recommendation_history"][-1])
+                except ValueError as e:
+                    logger.warning(f"Ignoring invalid recommendation history: {e}")
+                    context["recommendation_history"] = []
+                    return "There are no previous recommendations to go back to. Would you like to explore more options? (options: explore more, stop)", context
                 context["current_step"] = "recommend"
                 prompt = "Here are the previous recommendations:\n"
                 for gadget in context["last_retrieved_items"]:
@@ -380,7 +471,7 @@ def process_message(message, context):
                 prompt += "Generate a friendly and inviting response reintroducing these gadgets to the user in a conversational tone. Start with a warm greeting like 'Let’s take a look at the previous options I found for you!' Mention each gadget's name, price (with a dollar symbol), features, user reviews, and popularity score. Encourage the user to engage further by asking 'Which one of these devices catches your eye now? Let me know and I can provide more information!'"
 
                 try:
-                    llm_response = llm(prompt, max_tokens=500, stop=["\n\n"], temperature=0.7)
+                    llm_response = speculator.generate(prompt, max_tokens=500, stop=["\n\n"], temperature=0.7)
                     response = llm_response["choices"][0]["text"].strip()
                     # Ensure the response contains the product list
                     if not any(gadget["Product Name"] in response for gadget in context["last_retrieved_items"]):
@@ -395,9 +486,9 @@ def process_message(message, context):
                         response += f"- {gadget['Product Name']}: {gadget['Specifications']}, priced at ${gadget['Price']}, features: {gadget['Features']}, user reviews: {gadget['User Reviews']}, popularity score: {gadget['Popularity Score']}\n"
                     response += "Which one of these devices catches your eye now? Let me know and I can provide more information!"
 
-                return f"{response}\nWould you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, explore more, go back to the previous recommendations)", context
+                return f"{response}\nWould you like to compare these products, proceed with one of these options, or stop the process? (options: compare, proceed, stop, show next results, explore more, go back to the previous recommendations)", context
             return "There are no previous recommendations to go back to. Would you like to explore more options? (options: explore more, stop)", context
-        return "Please select an option: proceed, stop, explore more, go back to the previous recommendations", context
+        return "Please select an option: proceed, stop, show next results, explore more, go back to the previous recommendations", context
 
     if current_step == "select_product":
         recommended_products = context.get("last_retrieved_items", [])
@@ -427,7 +518,7 @@ def process_message(message, context):
         if message == "add to cart":
             selected_product = context.get("selected_product", {})
             if selected_product:
-                context["cart"] = context.get("cart", []) + [selected_product]
+                context["cart"] = cart_store.add_item(session_id, selected_product["ID"])
                 response = f"{selected_product['Product Name']} has been added to your cart! Would you like to explore more items or finalize your order? (options: explore more, finalize my order)"
             else:
                 response = "No product selected to add to cart. Let's explore more options. What type of gadget are you looking for? (options: Smartphone, Laptop, Tablet, Smartwatch, Headphones)"
@@ -441,14 +532,16 @@ def process_message(message, context):
             return "Let's explore more options. What type of gadget are you looking for? (options: Smartphone, Laptop, Tablet, Smartwatch, Headphones)", context
 
         if message == "finalize my order":
-            cart = context.get("cart", [])
+            cart = [GADGETS_BY_ID[gadget_id] for gadget_id in cart_store.get_cart(session_id) if gadget_id in GADGETS_BY_ID]
             if not cart:
                 response = "Your cart is empty. Let's explore more gadgets! What type of gadget are you looking for? (options: Smartphone, Laptop, Tablet, Smartwatch, Headphones)"
                 context["current_step"] = "category"
             else:
                 cart_items = "\n".join([f"- {item['Product Name']}: ${item['Price']}" for item in cart])
                 total_price = sum(item["Price"] for item in cart)
-                response = f"Thank you for your order! Here’s what you’ve selected:\n{cart_items}\nTotal: ${total_price}\nYour order has been finalized. If you'd like to explore more gadgets, just say 'start'."
+                # Queued for the background writer; no disk I/O on the request path
+                order_id = cart_store.finalize_order(session_id, [(item["ID"], item["Price"]) for item in cart])
+                response = f"Thank you for your order! Here’s what you’ve selected:\n{cart_items}\nTotal: ${total_price}\nYour order #{order_id[:8]} has been finalized. If you'd like to explore more gadgets, just say 'start'."
                 context["current_step"] = "category"
                 context["preferences"] = {}
                 context["recommendation_history"] = []
@@ -459,14 +552,39 @@ def process_message(message, context):
 
     return "I'm not sure how to proceed. Please select an option or say 'start' to begin again.", context
 
-# FastAPI endpoint for chat
+# FastAPI endpoint for chat (sync, so FastAPI runs it in its threadpool and requests can overlap)
 @app.post("/chat")
-async def chat(request: ChatRequest):
+def chat(request: ChatRequest):
     message = request.message.lower().strip()
     context = request.context or {}
-    response, updated_context = process_message(message, context)
+    speculator.request_started()
+    try:
+        response, updated_context = process_message(message, context)
+    finally:
+        speculator.request_finished()
     return {"response": response, "context": updated_context}
 
+# Stop speculative work, flush pending cart/order writes and stop shard workers before the server exits
+@app.on_event("shutdown")
+def shutdown():
+    speculator.close()
+    cart_store.close()
+    if sharded_index is not None:
+        sharded_index.close()
+
+# Free-text semantic search, optionally scoped to a category (e.g. the user's preferences["category"]);
+# sync so the encode and shard round trips run in the threadpool, not on the event loop
+@app.get("/search")
+def search(query: str, category: str = None, k: int = Query(3, ge=1, le=MAX_SEARCH_K)):
+    return {"results": search_gadgets(query, category.lower() if category else None, k)}
+
+# Retrieval health, including per-shard liveness and latency in sharded mode
+@app.get("/retrieval/health")
+async def retrieval_health():
+    if sharded_index is None:
+        return {"mode": "single", "items": faiss_index.ntotal}
+    return {"mode": RETRIEVAL_SHARDS, "shards": sharded_index.health()}
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Query
 import chromadb
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_embedding_model
 
 app = FastAPI()
 
@@ -9,7 +9,7 @@ chroma_client = chromadb.PersistentClient(path="./chroma_db")
 product_collection = chroma_client.get_collection(name="products")
 
 # Load embedding model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedding_model()
 
 @app.get("/recommend")
 def recommend_gadget(query: str = Query(..., description="Describe your needs (e.g., best gaming laptop under $1500)")):
@@ -0,0 +1,288 @@
+import json
+import re
+import time
+from collections import deque
+
+# Words and phrases that name each category
+CATEGORY_SYNONYMS = {
+    "smartphone": ["smartphone", "smartphones", "smart phone", "phone", "phones", "mobile", "mobiles", "cellphone", "cell phone"],
+    "laptop": ["laptop", "laptops", "notebook", "notebooks", "ultrabook"],
+    "tablet": ["tablet", "tablets", "tab", "tabs"],
+    "smartwatch": ["smartwatch", "smartwatches", "smart watch", "smart watches", "watch", "watches", "fitness tracker"],
+    "headphones": ["headphones", "headphone", "headset", "headsets", "earphones", "earbuds", "earpods"],
+}
+
+# Category synonyms that are also everyday words ("watch a movie", "keep tabs"); they only set
+# the category when nothing else in the message names one
+WEAK_CATEGORY_SYNONYMS = {"watch", "watches", "tab", "tabs"}
+
+# Product lines that imply a category and/or a brand
+PRODUCT_LINES = {
+    "iphone": ("smartphone", "apple"),
+    "ipad": ("tablet", "apple"),
+    "macbook": ("laptop", "apple"),
+    "apple watch": ("smartwatch", "apple"),
+    "galaxy": (None, "samsung"),
+    "galaxy watch": ("smartwatch", "samsung"),
+    "galaxy tab": ("tablet", "samsung"),
+    "thinkpad": ("laptop", "lenovo"),
+    "surface": ("laptop", "microsoft"),
+    "redmi": ("smartphone", "xiaomi"),
+}
+
+BRAND_SYNONYMS = {
+    "hp": ["hp", "hewlett packard"],
+    "oneplus": ["oneplus", "one plus"],
+}
+
+SORT_SYNONYMS = {
+    "best seller": ["best seller", "best sellers", "bestseller", "best selling", "most popular", "popular", "top rated", "best rated"],
+    "new arrival": ["new arrival", "new arrivals", "newest", "latest", "most recent", "newest first"],
+    "price low to high": ["price low to high", "low to high", "cheapest", "cheapest first", "lowest price", "least expensive"],
+    "price high to low": ["price high to low", "high to low", "most expensive", "priciest", "highest price", "expensive first"],
+}
+
+# Keywords used by the budget patterns; part of the typo-correction vocabulary
+BUDGET_WORDS = [
+    "under", "below", "less", "than", "within", "maximum", "max", "cheaper", "budget",
+    "over", "above", "more", "least", "minimum", "min", "from",
+    "around", "about", "approximately", "roughly", "between", "and", "to",
+    "dollars", "dollar", "bucks", "usd",
+]
+
+NUMBER = r"(\d[\d,]*(?:\.\d+)?k?)"
+THOUSANDS = r"(\d[\d,]*(?:\.\d+)?k)"
+MONEY = r"(?:\$ )?" + NUMBER + r"(?: (?:dollars?|bucks|usd))?"
+RANGE_SEPARATOR = r" (?:- |to |and )"
+# A pair of numbers only counts as a budget with a money cue, so "iphone 15 and 16" is not one
+RANGE_PATTERN = re.compile("|".join([
+    r"\b(?:between|from) " + MONEY + RANGE_SEPARATOR + MONEY,
+    r"\$ " + NUMBER + RANGE_SEPARATOR + r"(?:\$ )?" + NUMBER,
+    NUMBER + RANGE_SEPARATOR + r"\$ " + NUMBER,
+    NUMBER + RANGE_SEPARATOR + NUMBER + r" (?:dollars?|bucks|usd)\b",
+    NUMBER + RANGE_SEPARATOR + THOUSANDS,
+]))
+UPPER_PATTERN = re.compile(r"\b(?:under|below|less than|up to|max|maximum|within|cheaper than|no more than|budget(?: of| is)?|<) " + MONEY)
+LOWER_PATTERN = re.compile(r"\b(?:over|above|more than|at least|min|minimum|from|>) " + MONEY)
+AROUND_PATTERN = re.compile(r"\b(?:around|about|approximately|roughly|~) " + MONEY)
+BARE_PATTERN = re.compile(r"\$ " + NUMBER + r"|" + NUMBER + r" (?:dollars?|bucks|usd)\b")
+
+TOKEN_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?k?|[a-z]+|[$<>~-]")
+
+# Words shorter than this are never typo-corrected (too many false positives); words of exactly
+# this length are only corrected by restoring a dropped letter ("undr" -> "under")
+MIN_FUZZY_LENGTH = 4
+# "around X" becomes X +/- this fraction
+AROUND_TOLERANCE = 0.2
+
+
+def parse_amount(text):
+    """Turns '1,200', '1.5k' or '999' into an integer amount."""
+    text = text.replace(",", "")
+    if text.endswith("k"):
+        return int(float(text[:-1]) * 1000)
+    return int(float(text))
+
+
+def parse_range(low_text, high_text):
+    """Parses a budget range, carrying a trailing 'k' back to the low end ('2 to 3k' is 2000-3000)."""
+    low, high = parse_amount(low_text), parse_amount(high_text)
+    if high_text.endswith("k") and not low_text.endswith("k") and low * 1000 <= high:
+        low *= 1000
+    return tuple(sorted((low, high)))
+
+
+def deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class TokenAutomaton:
+    """Aho-Corasick automaton over word tokens, so 'hp' never matches inside 'iphone'."""
+
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for phrase, payload in phrases:
+            state = 0
+            words = phrase.split()
+            for word in words:
+                if word not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][word] = len(self.goto) - 1
+                state = self.goto[state][word]
+            self.output[state].append((len(words), payload))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find_all(self, tokens):
+        """Yields (start, end, payload) for every phrase occurrence in the token list."""
+        state = 0
+        for end, token in enumerate(tokens, 1):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+            for length, payload in self.output[state]:
+                yield end - length, end, payload
+
+
+class PreferenceExtractor:
+    """Pulls category, brand, budget and sort preferences out of one free-text message.
+
+    All phrase tables are compiled once; extraction is a tokenise, a typo-correction lookup
+    per word, one automaton pass and a few regexes, with no LLM call.
+    """
+
+    def __init__(self, category_brands, category_budget_ranges):
+        self.category_brands = category_brands
+        self.category_budget_ranges = category_budget_ranges
+
+        phrases = []
+        for category, synonyms in CATEGORY_SYNONYMS.items():
+            phrases += [
+                (synonym, ("weak_category" if synonym in WEAK_CATEGORY_SYNONYMS else "category", category))
+                for synonym in synonyms
+            ]
+        for brand in sorted({brand for brands in category_brands.values() for brand in brands}):
+            phrases += [(synonym, ("brand", brand)) for synonym in BRAND_SYNONYMS.get(brand, [brand])]
+        for line, (category, brand) in PRODUCT_LINES.items():
+            phrases.append((line, ("line", (category, brand))))
+        for sort, synonyms in SORT_SYNONYMS.items():
+            phrases += [(synonym, ("sort", sort)) for synonym in synonyms]
+        self.automaton = TokenAutomaton(phrases)
+
+        # Deletion index for edit-distance-1 typo correction
+        self.vocabulary = {word for phrase, _ in phrases for word in phrase.split()} | set(BUDGET_WORDS)
+        self.corrections = {}
+        for word in self.vocabulary:
+            if len(word) < MIN_FUZZY_LENGTH:
+                continue
+            for variant in deletions(word) | {word}:
+                self.corrections.setdefault(variant, set()).add(word)
+
+        # Brands sold in exactly one category let us infer the category
+        brand_categories = {}
+        for category, brands in category_brands.items():
+            for brand in brands:
+                brand_categories.setdefault(brand, []).append(category)
+        self.brand_only_category = {brand: cats[0] for brand, cats in brand_categories.items() if len(cats) == 1}
+        self.max_price = max(high for ranges in category_budget_ranges.values() for _, high in ranges.values())
+
+    def correct(self, token):
+        if token in self.vocabulary or len(token) < MIN_FUZZY_LENGTH or not token.isalpha():
+            return token
+        candidates = set()
+        for variant in deletions(token) | {token}:
+            candidates |= self.corrections.get(variant, set())
+        if len(token) == MIN_FUZZY_LENGTH:
+            candidates = {word for word in candidates if len(word) > len(token)}
+        # Only correct when the typo is unambiguous
+        return candidates.pop() if len(candidates) == 1 else token
+
+    def extract_budget(self, text, category=None):
+        match = RANGE_PATTERN.search(text)
+        if match:
+            low_text, high_text = [amount for amount in match.groups() if amount]
+            return parse_range(low_text, high_text)
+        match = UPPER_PATTERN.search(text)
+        if match:
+            return (0, parse_amount(match.group(1)))
+        match = LOWER_PATTERN.search(text)
+        if match:
+            ceiling = self.max_price
+            if category in self.category_budget_ranges:
+                ceiling = max(high for _, high in self.category_budget_ranges[category].values())
+            return (parse_amount(match.group(1)), max(ceiling, parse_amount(match.group(1))))
+        match = AROUND_PATTERN.search(text)
+        if match:
+            amount = parse_amount(match.group(1))
+            return (int(amount * (1 - AROUND_TOLERANCE)), int(amount * (1 + AROUND_TOLERANCE)))
+        match = BARE_PATTERN.search(text)
+        if match:
+            return (0, parse_amount(match.group(1) or match.group(2)))
+        return None
+
+    def extract(self, message):
+        """Returns a dict with whichever of category, brand, budget and sort the message mentions."""
+        tokens = [self.correct(token) for token in TOKEN_PATTERN.findall(message.lower())]
+
+        # Keep the leftmost-longest non-overlapping matches
+        matches = sorted(self.automaton.find_all(tokens), key=lambda m: (m[0], -(m[1] - m[0])))
+        preferences = {}
+        covered = 0
+        for start, end, (kind, value) in matches:
+            if start < covered:
+                continue
+            covered = end
+            if kind == "line":
+                category, brand = value
+                if category:
+                    preferences.setdefault("category", category)
+                preferences.setdefault("brand", brand)
+            else:
+                preferences.setdefault(kind, value)
+
+        brand = preferences.get("brand")
+        if "category" not in preferences and brand in self.brand_only_category:
+            preferences["category"] = self.brand_only_category[brand]
+        weak_category = preferences.pop("weak_category", None)
+        if "category" not in preferences and weak_category:
+            preferences["category"] = weak_category
+        category = preferences.get("category")
+        if brand and category and brand not in self.category_brands[category]:
+            del preferences["brand"]
+
+        budget = self.extract_budget(" ".join(tokens), category)
+        if budget:
+            preferences["budget"] = budget
+        return preferences
+
+
+def evaluate(extractor, corpus_path="preference_extraction_corpus.jsonl"):
+    """Scores the extractor against a labelled corpus and times it. Returns a summary dict."""
+    with open(corpus_path, encoding="utf-8") as file:
+        cases = [json.loads(line) for line in file if line.strip()]
+
+    fields = ["category", "brand", "budget", "sort"]
+    correct = {field: 0 for field in fields}
+    exact = 0
+    failures = []
+    start = time.perf_counter()
+    results = [extractor.extract(case["message"]) for case in cases]
+    elapsed = time.perf_counter() - start
+
+    for case, result in zip(cases, results):
+        expected = case["expected"]
+        result = {key: list(value) if key == "budget" else value for key, value in result.items()}
+        for field in fields:
+            correct[field] += expected.get(field) == result.get(field)
+        if all(expected.get(field) == result.get(field) for field in fields):
+            exact += 1
+        else:
+            failures.append({"message": case["message"], "expected": expected, "got": result})
+
+    return {
+        "cases": len(cases),
+        "exact_match": exact / len(cases),
+        "field_accuracy": {field: correct[field] / len(cases) for field in fields},
+        "microseconds_per_message": elapsed / len(cases) * 1e6,
+        "failures": failures,
+    }
+
+
+if __name__ == "__main__":
+    from catalog_options import category_brands, category_budget_ranges
+
+    summary = evaluate(PreferenceExtractor(category_brands, category_budget_ranges))
+    print(json.dumps(summary, indent=2))
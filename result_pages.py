@@ -0,0 +1,113 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Number of gadgets shown per recommendation page
+PAGE_SIZE = 3
+
+# Sort option -> (key function, descending)
+SORT_ORDERS = {
+    "best seller": (lambda gadget: gadget["Popularity Score"], True),
+    "new arrival": (lambda gadget: gadget["ID"], True),
+    "price low to high": (lambda gadget: gadget["Price"], False),
+    "price high to low": (lambda gadget: gadget["Price"], True),
+}
+
+# Separator between the fields of a cursor token
+CURSOR_SEPARATOR = "|"
+
+# Most (filter key, sort) result sets kept in memory at once
+MAX_RESULT_SETS = 1024
+
+
+def format_cursor(filter_key, sort, offset):
+    """Encodes a (filter key, sort, offset) triple as a cursor token: category|brand|min-max|sort|offset."""
+    category, brand, budget = filter_key
+    budget_key = f"{budget[0]}-{budget[1]}" if budget else ""
+    return CURSOR_SEPARATOR.join([category, brand, budget_key, sort, str(offset)])
+
+
+def make_cursor(preferences, offset=0):
+    """Builds the cursor for the user's preferences. Missing brand or budget fields match every gadget."""
+    filter_key = (preferences.get("category", ""), preferences.get("brand", ""), preferences.get("budget"))
+    return format_cursor(filter_key, preferences.get("sort", "best seller"), offset)
+
+
+def parse_cursor(cursor):
+    """Splits a cursor token into its filter key, sort option and offset.
+
+    Cursors round-trip through the client, so anything malformed raises ValueError.
+    """
+    if not isinstance(cursor, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    fields = cursor.split(CURSOR_SEPARATOR)
+    if len(fields) != 5:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    category, brand, budget_key, sort, offset = fields
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Invalid cursor sort: {sort!r}")
+    budget = None
+    if budget_key:
+        bounds = budget_key.split("-")
+        if len(bounds) != 2:
+            raise ValueError(f"Invalid cursor budget: {budget_key!r}")
+        budget = (int(bounds[0]), int(bounds[1]))
+    offset = int(offset)
+    if offset < 0:
+        raise ValueError(f"Invalid cursor offset: {offset}")
+    return (category, brand, budget), sort, offset
+
+
+class ResultSets:
+    """Filtered, pre-sorted result sets over the gadget catalog, addressed by cursor tokens.
+
+    Each (filter key, sort) combination is filtered and sorted once; every page after that
+    is a slice of the cached list of row indices.
+    """
+
+    def __init__(self, gadgets, page_size=PAGE_SIZE, max_entries=MAX_RESULT_SETS):
+        self.gadgets = gadgets
+        self.page_size = page_size
+        self.max_entries = max_entries
+        # LRU: free-text budgets make the key space unbounded
+        self._sorted = OrderedDict()
+        # Shared by request threads and the speculative worker
+        self._lock = threading.Lock()
+
+    def _sorted_rows(self, filter_key, sort):
+        with self._lock:
+            rows = self._sorted.get((filter_key, sort))
+            if rows is not None:
+                self._sorted.move_to_end((filter_key, sort))
+                return rows
+        category, brand, budget = filter_key
+        rows = [
+            i for i, gadget in enumerate(self.gadgets)
+            if (not category or gadget["Category"].lower() == category)
+            and (not brand or gadget["Brand"].lower() == brand)
+            and (budget is None or budget[0] <= gadget["Price"] <= budget[1])
+        ]
+        key, reverse = SORT_ORDERS[sort]
+        rows.sort(key=lambda i: key(self.gadgets[i]), reverse=reverse)
+        with self._lock:
+            self._sorted[(filter_key, sort)] = rows
+            while len(self._sorted) > self.max_entries:
+                self._sorted.popitem(last=False)
+        logger.info(f"Cached {len(rows)} sorted results for {filter_key} ({sort})")
+        return rows
+
+    def page(self, cursor):
+        """Returns the gadgets on the page a cursor points to and the cursor for the next page (or None).
+
+        Raises ValueError for a malformed cursor.
+        """
+        filter_key, sort, offset = parse_cursor(cursor)
+        rows = self._sorted_rows(filter_key, sort)
+        end = offset + self.page_size
+        gadgets = [self.gadgets[i] for i in rows[offset:end]]
+        next_cursor = None
+        if end < len(rows):
+            next_cursor = format_cursor(filter_key, sort, end)
+        return gadgets, next_cursor
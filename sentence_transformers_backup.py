@@ -1,7 +1,7 @@
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_embedding_model
 
 # Load embedding model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedding_model()
 
 # Example product
 product = {
@@ -0,0 +1,315 @@
+import argparse
+import csv
+import heapq
+import json
+import logging
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener, wait
+
+logger = logging.getLogger(__name__)
+
+# Environment variable carrying the shared secret to worker processes (kept out of argv)
+AUTHKEY_ENV = "SHARD_AUTHKEY"
+# Round-trip latencies and worker service times kept per shard for health reporting
+LATENCY_WINDOW = 256
+
+
+def shard_specs(mode, categories):
+    """Turns a RETRIEVAL_SHARDS setting ("category" or "hash:N") into shard specs."""
+    if mode == "category":
+        return [{"name": category, "category": category} for category in categories]
+    if mode.startswith("hash:"):
+        count = int(mode.split(":", 1)[1])
+        if count < 1:
+            raise ValueError(f"Shard count must be at least 1: {mode}")
+        return [{"name": f"hash-{i}", "hash": [i, count]} for i in range(count)]
+    raise ValueError(f"Unknown shard mode: {mode}")
+
+
+def in_shard(gadget, spec):
+    if "category" in spec:
+        return gadget["Category"].lower() == spec["category"]
+    shard, count = spec["hash"]
+    return gadget["ID"] % count == shard
+
+
+# Same catalog text that main.py embeds
+def gadget_description(gadget):
+    return f"{gadget['Product Name']} {gadget['Category']} {gadget['Brand']} {gadget['Specifications']} {gadget['Features']}"
+
+
+def load_shard_rows(dataset_path, spec):
+    rows = []
+    with open(dataset_path, mode="r", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            row["ID"] = int(row["ID"])
+            if in_shard(row, spec):
+                rows.append({"ID": row["ID"], "Category": row["Category"].lower(), "text": gadget_description(row)})
+    return rows
+
+
+def run_shard_worker(address, spec, dataset_path):
+    """Shard process: builds a FAISS index over its slice of the catalog and answers searches."""
+    import faiss
+    import numpy as np
+    from embedding_backend import load_embedding_model
+
+    rows = load_shard_rows(dataset_path, spec)
+    # A shard can be empty (e.g. more hash shards than gadgets); it still starts and answers with no hits
+    index = None
+    if rows:
+        model = load_embedding_model()
+        embeddings = np.asarray(model.encode([row["text"] for row in rows], convert_to_numpy=True), dtype=np.float32)
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(embeddings)
+    gadget_ids = [row["ID"] for row in rows]
+
+    # Per-category selectors so hash shards can still answer category-scoped queries
+    positions = {}
+    for position, row in enumerate(rows):
+        positions.setdefault(row["Category"], []).append(position)
+    selectors = {
+        category: faiss.IDSelectorBatch(np.array(members, dtype=np.int64))
+        for category, members in positions.items()
+    }
+
+    conn = Client(address, authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    conn.send(("ready", spec["name"], len(rows)))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request[0] == "stop":
+            return
+
+        _, sequence, vector, k, category = request
+        start = time.perf_counter()
+        # A bad request must not take the shard down; report it and keep serving
+        try:
+            if k < 1:
+                raise ValueError(f"k must be at least 1, got {k}")
+            hits = []
+            limit = len(positions.get(category, [])) if category else len(rows)
+            if limit:
+                query = np.asarray([vector], dtype=np.float32)
+                if category and category != spec.get("category"):
+                    params = faiss.SearchParameters(sel=selectors[category])
+                    distances, found = index.search(query, min(k, limit), params=params)
+                else:
+                    distances, found = index.search(query, min(k, limit))
+                hits = [(float(distance), gadget_ids[position]) for distance, position in zip(distances[0], found[0]) if position >= 0]
+        except Exception as e:
+            conn.send((sequence, "error", f"{type(e).__name__}: {e}", time.perf_counter() - start))
+            continue
+        conn.send((sequence, "ok", hits, time.perf_counter() - start))
+
+
+class ShardClient:
+    """Router-side handle on one shard process, with its health and latency counters."""
+
+    def __init__(self, spec, process):
+        self.spec = spec
+        self.name = spec["name"]
+        self.process = process
+        self.conn = None
+        self.items = 0
+        self.healthy = False
+        self.requests = 0
+        self.errors = 0
+        self.sequence = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.service_times = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def send(self, *payload):
+        self.sequence += 1
+        self.conn.send((payload[0], self.sequence) + payload[1:])
+        return self.sequence
+
+    def health(self):
+        report = {
+            "alive": self.process.poll() is None,
+            "healthy": self.healthy,
+            "items": self.items,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+        # Round trip as seen by the router, and time spent searching inside the worker
+        for key, samples in [("latency_ms", self.latencies), ("service_ms", self.service_times)]:
+            if samples:
+                ordered = sorted(samples)
+                report[key] = {
+                    "last": round(samples[-1] * 1000, 3),
+                    "avg": round(sum(ordered) / len(ordered) * 1000, 3),
+                    "p95": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+                }
+        return report
+
+
+class ShardedIndex:
+    """Scatter-gather FAISS retrieval over catalog shards living in separate worker processes.
+
+    Queries scoped to a category go straight to that category's shard when sharding by
+    category; everything else is sent to every shard at once and the per-shard top-k lists
+    are merged. Slow or dead shards are skipped and reported by `health`.
+    """
+
+    def __init__(self, specs, dataset_path="gadgets_dataset.csv", timeout=2.0, startup_timeout=600.0):
+        self.specs = specs
+        self.dataset_path = dataset_path
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.shards = {}
+        self._listener = None
+
+    def start(self):
+        authkey = secrets.token_bytes(32)
+        # Workers connect all at once; the default backlog of 1 drops handshakes
+        self._listener = Listener(("127.0.0.1", 0), backlog=len(self.specs), authkey=authkey)
+        env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+        host, port = self._listener.address
+
+        # Workers are plain subprocesses so they never re-import the API module (and its models)
+        for spec in self.specs:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--address", f"{host}:{port}",
+                 "--shard", json.dumps(spec), "--dataset", self.dataset_path],
+                env=env,
+            )
+            self.shards[spec["name"]] = ShardClient(spec, process)
+
+        connections = []
+        accepter = threading.Thread(target=self._accept_all, args=(connections,), daemon=True)
+        accepter.start()
+        deadline = time.monotonic() + self.startup_timeout
+        while accepter.is_alive():
+            accepter.join(0.5)
+            dead = [shard.name for shard in self.shards.values() if shard.process.poll() is not None]
+            if dead or time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError(f"Shard workers failed to start: {dead or 'timed out'}")
+        if len(connections) < len(self.specs):
+            self.close()
+            raise RuntimeError(f"Only {len(connections)} of {len(self.specs)} shard workers connected")
+
+        for conn, (_, name, items) in connections:
+            shard = self.shards[name]
+            shard.conn, shard.items, shard.healthy = conn, items, True
+        logger.info(f"Started {len(self.shards)} retrieval shards: {', '.join(self.shards)}")
+
+    def _accept_all(self, connections):
+        for _ in self.specs:
+            conn = self._listener.accept()
+            connections.append((conn, conn.recv()))
+
+    def _targets(self, category):
+        if category and category in self.shards and self.shards[category].spec.get("category") == category:
+            return [self.shards[category]]
+        return list(self.shards.values())
+
+    def search(self, query_vector, k=3, category=None):
+        """Returns up to k (distance, gadget ID) pairs, nearest first. Raises ValueError if k < 1."""
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        vector = [float(value) for value in query_vector]
+        targets = [shard for shard in self._targets(category) if shard.healthy]
+
+        # Scatter: every shard starts searching before we wait on any of them
+        pending = []
+        for shard in targets:
+            shard.lock.acquire()
+            try:
+                pending.append((shard, shard.send("search", vector, k, category), time.perf_counter()))
+            except (OSError, EOFError) as e:
+                shard.lock.release()
+                self._mark_failed(shard, e)
+
+        # Gather: take replies in arrival order, all shards sharing one deadline
+        results = []
+        waiting = {shard.conn: (shard, sequence, started) for shard, sequence, started in pending}
+        deadline = time.monotonic() + self.timeout
+        try:
+            while waiting:
+                remaining = deadline - time.monotonic()
+                ready = wait(list(waiting), remaining) if remaining > 0 else []
+                if not ready:
+                    break
+                for conn in ready:
+                    shard, sequence, started = waiting[conn]
+                    try:
+                        reply = conn.recv()
+                    except (OSError, EOFError) as e:
+                        del waiting[conn]
+                        shard.lock.release()
+                        self._mark_failed(shard, e)
+                        continue
+                    # Skip late replies to requests that already timed out
+                    if reply[0] != sequence:
+                        continue
+                    del waiting[conn]
+                    shard.lock.release()
+                    _, status, payload, service_time = reply
+                    shard.latencies.append(time.perf_counter() - started)
+                    shard.service_times.append(service_time)
+                    shard.requests += 1
+                    if status == "ok":
+                        results.extend(payload)
+                    else:
+                        # The shard rejected this request but is still serving; keep it healthy
+                        shard.errors += 1
+                        logger.error(f"Retrieval shard {shard.name} could not answer a search: {payload}")
+        finally:
+            for shard, _, _ in waiting.values():
+                shard.lock.release()
+                self._mark_failed(shard, TimeoutError(f"Shard {shard.name} did not answer within {self.timeout}s"))
+
+        return heapq.nsmallest(k, results)
+
+    def _mark_failed(self, shard, error):
+        shard.errors += 1
+        if shard.process.poll() is not None or not isinstance(error, TimeoutError):
+            shard.healthy = False
+        logger.error(f"Retrieval shard {shard.name} failed: {error}")
+
+    def health(self):
+        """Per-shard liveness, item counts and round-trip latency."""
+        for shard in self.shards.values():
+            if shard.healthy and shard.process.poll() is not None:
+                shard.healthy = False
+        return {name: shard.health() for name, shard in self.shards.items()}
+
+    def close(self):
+        for shard in self.shards.values():
+            if shard.conn is not None:
+                try:
+                    shard.send("stop")
+                    shard.conn.close()
+                except (OSError, EOFError):
+                    pass
+            try:
+                shard.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                shard.process.kill()
+            shard.healthy = False
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval shard worker")
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--shard", required=True)
+    parser.add_argument("--dataset", required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    host, port = args.address.rsplit(":", 1)
+    run_shard_worker((host, int(port)), json.loads(args.shard), args.dataset)
@@ -0,0 +1,180 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class Speculator:
+    """Runs speculative recommendation work on a low-priority background thread.
+
+    All LLM calls go through `generate` (foreground) or `speculate_llm` (background) so the
+    model is never used by two threads at once. Background work is dropped when the queue is
+    full, when it has gone stale, or under load: more than `max_in_flight` concurrent requests,
+    or more than `max_recent_requests` started in the last `load_window` seconds.
+
+    A running speculative generation is abandoned at the next token once a foreground request
+    needs the model. Prompt prefill cannot be interrupted, so a foreground `generate` may wait for
+    one prefill; speculation only runs for prompts of at most `max_prefill_tokens` to bound that
+    wait, and llama.cpp reuses the evaluated prefix when the foreground prompt shares it.
+    """
+
+    def __init__(self, llm, enabled=False, max_pending=8, max_age=30.0, max_results=256, max_in_flight=1,
+                 max_recent_requests=5, load_window=10.0, max_prefill_tokens=512):
+        self.llm = llm
+        self.enabled = enabled
+        self.max_age = max_age
+        self.max_results = max_results
+        self.max_in_flight = max_in_flight
+        self.max_recent_requests = max_recent_requests
+        self.load_window = load_window
+        self.max_prefill_tokens = max_prefill_tokens
+
+        self._llm_lock = threading.Lock()
+        self._llm_waiting = 0
+        self._in_flight = 0
+        self._recent_requests = deque()
+        self._state_lock = threading.Lock()
+        self._results = OrderedDict()
+        self._choices = {}
+        self._stats = Counter()
+
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._worker = None
+        if enabled:
+            self._worker = threading.Thread(target=self._run_worker, name="speculator", daemon=True)
+            self._worker.start()
+
+    def request_started(self):
+        with self._state_lock:
+            self._in_flight += 1
+            self._recent_requests.append(time.monotonic())
+
+    def request_finished(self):
+        with self._state_lock:
+            self._in_flight -= 1
+
+    def _busy(self):
+        with self._state_lock:
+            cutoff = time.monotonic() - self.load_window
+            while self._recent_requests and self._recent_requests[0] < cutoff:
+                self._recent_requests.popleft()
+            return (
+                self._in_flight > self.max_in_flight
+                or len(self._recent_requests) > self.max_recent_requests
+                or self._llm_waiting > 0
+            )
+
+    def record_choice(self, step, option):
+        """Counts which option users pick at a step, to guess the most likely one next time."""
+        with self._state_lock:
+            self._choices.setdefault(step, Counter())[option] += 1
+
+    def likely_choice(self, step, default):
+        with self._state_lock:
+            counts = self._choices.get(step)
+            return counts.most_common(1)[0][0] if counts else default
+
+    def submit(self, job):
+        """Queues a callable to run in the background; silently dropped if disabled or busy."""
+        if not self.enabled:
+            return False
+        if self._busy():
+            self._stats["dropped_busy"] += 1
+            return False
+        try:
+            self._jobs.put_nowait((time.monotonic(), job))
+        except queue.Full:
+            self._stats["dropped_full"] += 1
+            return False
+        return True
+
+    def _run_worker(self):
+        # Lower this thread's scheduling priority (per-thread on Linux; unavailable on Windows)
+        if hasattr(os, "nice"):
+            try:
+                os.nice(10)
+            except OSError:
+                pass
+        while True:
+            submitted_at, job = self._jobs.get()
+            if job is None:
+                return
+            if time.monotonic() - submitted_at > self.max_age:
+                self._stats["dropped_stale"] += 1
+                continue
+            if self._busy():
+                self._stats["dropped_busy"] += 1
+                continue
+            try:
+                job()
+            except Exception as e:
+                logger.error(f"Speculative job failed: {e}")
+
+    def generate(self, prompt, **kwargs):
+        """Foreground LLM call; pre-empts any speculative generation that holds the model."""
+        with self._state_lock:
+            self._llm_waiting += 1
+        try:
+            self._llm_lock.acquire()
+        finally:
+            with self._state_lock:
+                self._llm_waiting -= 1
+        try:
+            return self.llm(prompt, **kwargs)
+        finally:
+            self._llm_lock.release()
+
+    def speculate_llm(self, prompt, **kwargs):
+        """Background LLM call whose text is kept for `take`; abandoned if the foreground needs the model."""
+        with self._state_lock:
+            if prompt in self._results:
+                return
+        if self._busy() or not self._llm_lock.acquire(blocking=False):
+            self._stats["dropped_busy"] += 1
+            return
+        try:
+            if len(self.llm.tokenize(prompt.encode("utf-8"))) > self.max_prefill_tokens:
+                self._stats["dropped_long_prompt"] += 1
+                return
+            chunks = []
+            stream = self.llm(prompt, stream=True, **kwargs)
+            for chunk in stream:
+                if self._llm_waiting:
+                    stream.close()
+                    self._stats["cancelled"] += 1
+                    return
+                chunks.append(chunk["choices"][0]["text"])
+        finally:
+            self._llm_lock.release()
+
+        with self._state_lock:
+            self._results[prompt] = "".join(chunks).strip()
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        self._stats["completed"] += 1
+
+    def take(self, prompt):
+        """Returns and forgets the speculative text for a prompt, or None if there isn't one."""
+        with self._state_lock:
+            text = self._results.pop(prompt, None)
+        self._stats["hits" if text is not None else "misses"] += 1
+        return text
+
+    def stats(self):
+        return dict(self._stats)
+
+    def close(self):
+        if self._worker is not None:
+            # Discard queued work so the sentinel always fits
+            while not self._jobs.empty():
+                try:
+                    self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+            self._jobs.put((time.monotonic(), None))
+            self._worker.join()
+            self._worker = None